@@ -1,29 +1,92 @@
 from flask import Flask, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-import time
+import orjson
+import timeit
 import random
-from werkzeug.security import generate_password_hash, check_password_hash
+import bisect
+import heapq
+from sortedcontainers import SortedDict
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHash
 import jwt
 from datetime import datetime, timedelta
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
 
+class ORJSONProvider(JSONProvider):
+    """Serve jsonify() responses and parse request bodies with orjson.
+
+    Mirrors Flask's default provider: keys are sorted, responses are indented
+    in debug mode and end with a newline. Non-ASCII text is emitted as UTF-8
+    rather than \\u escapes.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, option=option) + b'\n', mimetype='application/json')
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 IMAGE_FOLDER = os.path.join(os.path.dirname(__file__), 'engine_images')
 
 # MongoDB setup
-client = MongoClient('mongodb://localhost:27017/')
+MONGO_URI = 'mongodb://localhost:27017/'
+client = MongoClient(MONGO_URI)
 db = client['key_value_store']
 users_collection = db['users']
 data_collection = db['data']
 
+# Unique username index, created on the first signup rather than at import so an
+# unreachable MongoDB can't stall startup (or the reloader's second import). It is
+# attempted once per process with a short timeout; if it can't be built (MongoDB
+# down, or legacy duplicate usernames) signup still rejects duplicates through its
+# find_one check, just without the race protection.
+username_index_attempted = False
+
+def ensure_username_index():
+    global username_index_attempted
+    if username_index_attempted:
+        return
+    username_index_attempted = True
+    index_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+    try:
+        index_client[db.name][users_collection.name].create_index("username", unique=True)
+    except PyMongoError as e:
+        app.logger.warning(f"Could not create unique username index: {str(e)}")
+    finally:
+        index_client.close()
+
+# Password hashing: argon2 for new hashes, werkzeug PBKDF2 hashes still verify
+password_hasher = PasswordHasher()
+
+def verify_password(stored_hash, password):
+    """Check a password against a stored argon2 or legacy werkzeug hash"""
+    if stored_hash.startswith('$argon2'):
+        try:
+            return password_hasher.verify(stored_hash, password)
+        except (VerificationError, InvalidHash):
+            return False
+    return check_password_hash(stored_hash, password)
+
 # B+ Tree Implementation
 class BPlusTree:
     def __init__(self, degree=3):
         self.degree = degree
-        self.data = {}
+        self.data = SortedDict()
 
     def insert(self, key, value):
         self.data[key] = value
@@ -32,7 +95,7 @@ class BPlusTree:
         return self.data.get(key)
 
     def range_query(self, start_key, end_key):
-        return {k: v for k, v in self.data.items() if start_key <= k <= end_key}
+        return {k: self.data[k] for k in self.data.irange(start_key, end_key, inclusive=(True, True))}
 
     def delete(self, key):
         if key in self.data:
@@ -41,9 +104,9 @@ class BPlusTree:
 # LSM Tree Implementation
 class LSMTree:
     def __init__(self, max_memtable_size=1000):
-        self.memtable = {}
+        self.memtable = SortedDict()
         self.max_memtable_size = max_memtable_size
-        self.sstables = []
+        self.sstables = []  # (keys, values) pairs, keys sorted, oldest first
 
     def insert(self, key, value):
         self.memtable[key] = value
@@ -53,20 +116,26 @@ class LSMTree:
     def get(self, key):
         if key in self.memtable:
             return self.memtable[key]
-        for sstable in reversed(self.sstables):
-            if key in sstable:
-                return sstable[key]
+        for keys, values in reversed(self.sstables):
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                return values[index]
         return None
 
     def range_query(self, start_key, end_key):
+        # Each run is sorted by key; tag it with its age (0 = memtable) so the
+        # k-way merge yields the newest version of a key first.
+        runs = [((key, 0, self.memtable[key])
+                 for key in self.memtable.irange(start_key, end_key, inclusive=(True, True)))]
+        for age, (keys, values) in enumerate(reversed(self.sstables), start=1):
+            lo = bisect.bisect_left(keys, start_key)
+            hi = bisect.bisect_right(keys, end_key)
+            runs.append(zip(keys[lo:hi], [age] * (hi - lo), values[lo:hi]))
+
         result = {}
-        for key, value in self.memtable.items():
-            if start_key <= key <= end_key:
+        for key, _, value in heapq.merge(*runs):
+            if key not in result:
                 result[key] = value
-        for sstable in reversed(self.sstables):
-            for key, value in sstable.items():
-                if start_key <= key <= end_key and key not in result:
-                    result[key] = value
         return result
 
     def delete(self, key):
@@ -75,8 +144,8 @@ class LSMTree:
             self._flush_to_disk()
 
     def _flush_to_disk(self):
-        self.sstables.append(self.memtable.copy())
-        self.memtable = {}
+        self.sstables.append((list(self.memtable.keys()), list(self.memtable.values())))
+        self.memtable = SortedDict()
 
 # Initialize engines
 engines = {
@@ -102,15 +171,22 @@ def signup():
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
     
-    if users_collection.find_one({"username": username}):
+    ensure_username_index()
+    
+    # Cheap indexed check first, so duplicate signups skip the argon2 hash;
+    # the unique index still catches a concurrent signup racing past it
+    if users_collection.find_one({"username": username}, {"_id": 1}):
         return jsonify({"error": "Username already exists"}), 400
     
-    hashed_password = generate_password_hash(password)
-    users_collection.insert_one({
-        "username": username,
-        "password": hashed_password,
-        "created_at": datetime.utcnow()
-    })
+    hashed_password = password_hasher.hash(password)
+    try:
+        users_collection.insert_one({
+            "username": username,
+            "password": hashed_password,
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return jsonify({"error": "Username already exists"}), 400
     
     return jsonify({"status": "User created successfully"}), 201
 
@@ -123,10 +199,17 @@ def login():
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
     
-    user = users_collection.find_one({"username": username})
-    if not user or not check_password_hash(user['password'], password):
+    user = users_collection.find_one({"username": username}, {"password": 1})
+    if not user or not verify_password(user['password'], password):
         return jsonify({"error": "Invalid username or password"}), 401
     
+    # Upgrade legacy PBKDF2 hashes to argon2 now that the plaintext is known
+    if not user['password'].startswith('$argon2'):
+        users_collection.update_one(
+            {"_id": user['_id']},
+            {"$set": {"password": password_hasher.hash(password)}}
+        )
+    
     token = jwt.encode({
         'username': username,
         'exp': datetime.utcnow() + timedelta(hours=24)
@@ -158,8 +241,11 @@ def insert():
     if not key or not value:
         return jsonify({"error": "Key and value are required"}), 400
     
+    # JSON strings need no coercion; only numbers etc. go through str()
+    key = key if type(key) is str else str(key)
+    value = value if type(value) is str else str(value)
     try:
-        engines[current_engine].insert(str(key), str(value))
+        engines[current_engine].insert(key, value)
         return jsonify({"status": "Insert successful"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -167,7 +253,7 @@ def insert():
 @app.route('/get/<key>', methods=['GET'])
 def get(key):
     try:
-        value = engines[current_engine].get(str(key))
+        value = engines[current_engine].get(key)
         if value is None:
             return jsonify({"error": "Key not found"}), 404
         return jsonify({"value": value})
@@ -177,7 +263,7 @@ def get(key):
 @app.route('/range/<start_key>/<end_key>', methods=['GET'])
 def range_query(start_key, end_key):
     try:
-        results = engines[current_engine].range_query(str(start_key), str(end_key))
+        results = engines[current_engine].range_query(start_key, end_key)
         return jsonify({"results": results})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -185,11 +271,17 @@ def range_query(start_key, end_key):
 @app.route('/delete/<key>', methods=['DELETE'])
 def delete(key):
     try:
-        engines[current_engine].delete(str(key))
+        engines[current_engine].delete(key)
         return jsonify({"status": "Delete successful"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def time_ops(operation, calls):
+    """Average milliseconds per operation(*args) over calls, timed as one timeit batch"""
+    args = iter(calls)
+    timer = timeit.Timer(lambda: operation(*next(args)))
+    return timer.timeit(number=len(calls)) / len(calls) * 1000
+
 @app.route('/benchmark', methods=['GET'])
 def benchmark():
     results = {
@@ -204,50 +296,22 @@ def benchmark():
             try:
                 # Reset engine
                 if name == "bplus":
-                    engines[name] = BPlusTree(degree=3)
+                    engine = engines[name] = BPlusTree(degree=3)
                 else:
-                    engines[name] = LSMTree(max_memtable_size=1000)
-                
-                # Insert benchmark
-                insert_times = []
-                for i in range(size):
-                    key = str(i)
-                    value = f"value_{i}"
-                    start = time.perf_counter()
-                    engine.insert(key, value)
-                    insert_times.append(time.perf_counter() - start)
-                
-                # Get benchmark
-                get_times = []
-                sample_keys = random.sample(range(size), min(10, size))
-                for i in sample_keys:
-                    key = str(i)
-                    start = time.perf_counter()
-                    val = engine.get(key)
-                    get_times.append(time.perf_counter() - start)
-                
-                # Range query benchmark
-                range_times = []
-                for i in range(3):
-                    start_key = str(i * (size // 3))
-                    end_key = str((i + 1) * (size // 3) - 1)
-                    start = time.perf_counter()
-                    engine.range_query(start_key, end_key)
-                    range_times.append(time.perf_counter() - start)
+                    engine = engines[name] = LSMTree(max_memtable_size=1000)
                 
-                # Delete benchmark
-                delete_times = []
-                for i in sample_keys[:5]:
-                    key = str(i)
-                    start = time.perf_counter()
-                    engine.delete(key)
-                    delete_times.append(time.perf_counter() - start)
+                # Build the workload up front so only engine calls are timed
+                keys = [str(i) for i in range(size)]
+                values = [f"value_{i}" for i in range(size)]
+                sample_keys = [(keys[i],) for i in random.sample(range(size), min(10, size))]
+                delete_keys = sample_keys[:5]
+                ranges = [(str(i * (size // 3)), str((i + 1) * (size // 3) - 1)) for i in range(3)]
                 
                 # Store results in milliseconds
-                results[name]["insert"].append(sum(insert_times)/size * 1000)
-                results[name]["get"].append(sum(get_times)/len(get_times) * 1000)
-                results[name]["range"].append(sum(range_times)/len(range_times) * 1000)
-                results[name]["delete"].append(sum(delete_times)/len(delete_times) * 1000)
+                results[name]["insert"].append(time_ops(engine.insert, list(zip(keys, values))))
+                results[name]["get"].append(time_ops(engine.get, sample_keys))
+                results[name]["range"].append(time_ops(engine.range_query, ranges))
+                results[name]["delete"].append(time_ops(engine.delete, delete_keys))
                 
             except Exception as e:
                 return jsonify({"error": f"Benchmark failed for {name} at size {size}: {str(e)}"}), 500
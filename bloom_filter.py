@@ -0,0 +1,75 @@
+import hashlib
+import os
+import struct
+
+def key_hashes(key):
+    """Two independent 64-bit hashes of a key; compute once and reuse across filters"""
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return struct.unpack('<QQ', digest)
+
+class BloomFilter:
+    def __init__(self, num_bits, num_hashes=7):
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = num_hashes
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, bits_per_key=10, num_hashes=7):
+        """Build an empty filter sized for up to capacity keys (~1% false positives)"""
+        return cls(capacity * bits_per_key, num_hashes)
+
+    @classmethod
+    def for_keys(cls, keys, bits_per_key=10, num_hashes=7):
+        """Build a filter sized for the given keys (~1% false positives)"""
+        keys = list(keys)
+        bloom = cls.for_capacity(len(keys), bits_per_key, num_hashes)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, hashes):
+        """Derive all bit positions from the key's two hashes (double hashing)"""
+        h1, h2 = hashes
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        """Add a key to the filter"""
+        for pos in self._positions(key_hashes(key)):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, hashes):
+        """Probe with precomputed key_hashes(); False means the key is definitely absent"""
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(hashes))
+
+    def __contains__(self, key):
+        """Return False if the key is definitely absent, True if it may be present"""
+        return self.might_contain(key_hashes(key))
+
+    def save(self, path):
+        """Write the filter to disk; a temp file is moved into place so readers never see a partial one"""
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(struct.pack('<QI', self.num_bits, self.num_hashes))
+                f.write(self.bits)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter previously written with save()"""
+        with open(path, 'rb') as f:
+            num_bits, num_hashes = struct.unpack('<QI', f.read(12))
+            bloom = cls(num_bits, num_hashes)
+            bits = f.read()
+        if len(bits) != len(bloom.bits):
+            raise ValueError(f"Bloom filter {path} is truncated or corrupt")
+        bloom.bits = bytearray(bits)
+        return bloom
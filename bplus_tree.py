@@ -1,4 +1,9 @@
+import bisect
+
 class Node:
+    # Fixed attribute layout: no per-node __dict__, smaller nodes and faster attribute loads
+    __slots__ = ('keys', 'values', 'children', 'is_leaf', 'next')
+
     def __init__(self, is_leaf=False):
         self.keys = []
         self.values = []
@@ -7,7 +12,7 @@ class Node:
         self.next = None
 
 class BPlusTree:
-    def __init__(self, degree=3):
+    def __init__(self, degree=64):
         self.root = Node(is_leaf=True)
         self.degree = degree
         self.min_keys = degree - 1
@@ -24,21 +29,19 @@ class BPlusTree:
 
     def _insert_non_full(self, node, key, value):
         """Helper function to insert into a non-full node."""
-        if node.is_leaf:
-            index = 0
-            while index < len(node.keys) and key > node.keys[index]:
-                index += 1
-            node.keys.insert(index, key)
-            node.values.insert(index, value)
-        else:
-            index = 0
-            while index < len(node.keys) and key > node.keys[index]:
-                index += 1
-            if len(node.children[index].keys) == self.max_keys:
+        # Iterative descent: splitting full children on the way down keeps every
+        # visited node non-full, so no recursion is needed.
+        max_keys = self.max_keys
+        while not node.is_leaf:
+            index = bisect.bisect_left(node.keys, key)
+            if len(node.children[index].keys) == max_keys:
                 self._split_child(node, index)
                 if key > node.keys[index]:
                     index += 1
-            self._insert_non_full(node.children[index], key, value)
+            node = node.children[index]
+        index = bisect.bisect_left(node.keys, key)
+        node.keys.insert(index, key)
+        node.values.insert(index, value)
 
     def _split_child(self, parent, index):
         """Split a child node when it's full."""
@@ -51,15 +54,15 @@ class BPlusTree:
         if child.is_leaf:
             new_node.keys = child.keys[split_point:]
             new_node.values = child.values[split_point:]
-            child.keys = child.keys[:split_point]
-            child.values = child.values[:split_point]
+            del child.keys[split_point:]
+            del child.values[split_point:]
             new_node.next = child.next
             child.next = new_node
         else:
             new_node.keys = child.keys[split_point+1:]
             new_node.children = child.children[split_point+1:]
-            child.keys = child.keys[:split_point]
-            child.children = child.children[:split_point+1]
+            del child.keys[split_point:]
+            del child.children[split_point+1:]
         
         parent.keys.insert(index, middle_key)
         parent.children.insert(index + 1, new_node)
@@ -70,40 +73,33 @@ class BPlusTree:
 
     def _search(self, node, key):
         """Helper function to search for a key."""
-        if node.is_leaf:
-            index = 0
-            while index < len(node.keys) and key > node.keys[index]:
-                index += 1
-            if index < len(node.keys) and key == node.keys[index]:
-                return node.values[index]
-            return None
-        else:
-            index = 0
-            while index < len(node.keys) and key >= node.keys[index]:
-                index += 1
-            return self._search(node.children[index], key)
+        while not node.is_leaf:
+            node = node.children[bisect.bisect_right(node.keys, key)]
+        index = bisect.bisect_left(node.keys, key)
+        if index < len(node.keys) and key == node.keys[index]:
+            return node.values[index]
+        return None
 
     def range_query(self, start_key, end_key):
         """Get all values where start_key <= key <= end_key."""
         results = []
         leaf = self._find_leaf(self.root, start_key)
+        index = bisect.bisect_left(leaf.keys, start_key)
         
         while leaf:
-            for i, key in enumerate(leaf.keys):
-                if start_key <= key <= end_key:
-                    results.append((key, leaf.values[i]))
-                elif key > end_key:
+            for i in range(index, len(leaf.keys)):
+                key = leaf.keys[i]
+                if key > end_key:
                     return results
+                results.append((key, leaf.values[i]))
             leaf = leaf.next
+            index = 0
         return results
 
     def _find_leaf(self, node, key):
         """Find the leaf node where the key should be located."""
         while not node.is_leaf:
-            index = 0
-            while index < len(node.keys) and key >= node.keys[index]:
-                index += 1
-            node = node.children[index]
+            node = node.children[bisect.bisect_right(node.keys, key)]
         return node
 
     def delete(self, key):
@@ -130,9 +126,7 @@ class BPlusTree:
 
     def _delete_from_internal(self, node, key):
         """Delete a key from an internal node."""
-        index = 0
-        while index < len(node.keys) and key > node.keys[index]:
-            index += 1
+        index = bisect.bisect_left(node.keys, key)
         
         if index < len(node.keys) and key == node.keys[index]:
             self._delete_internal_key(node, index)
@@ -1,19 +1,75 @@
-import json
 import os
+import re
+import struct
+import threading
+import weakref
 from collections import OrderedDict
+from sortedcontainers import SortedDict
 import time
 import glob
+import logging
+from bloom_filter import BloomFilter, key_hashes
+from sstable import write_sstable, open_sstable, merge_sstables, SSTableReader
+
+logger = logging.getLogger(__name__)
+
+# sstable_<ts>, legacy sstable_compact_<ts>, and compacted sstable_<newest input ts>_c<ts>
+_SSTABLE_NAME = re.compile(r'sstable_(?:compact_)?(\d+)(?:_c(\d+))?')
+
+def _sstable_age(sstable):
+    """Sort key ordering SSTables oldest to newest by the timestamps in their names"""
+    match = _SSTABLE_NAME.match(os.path.basename(sstable))
+    if match is None:
+        return (0, 0)  # Unrecognised name, treat as oldest
+    return (int(match.group(1)), int(match.group(2) or 0))
+
+def _decode_wal_records(lines):
+    """Yield (key, value) from raw WAL lines, skipping malformed or torn records"""
+    for key, sep, value in (line.partition(b':') for line in lines):
+        if not sep:
+            continue  # No ':' separator
+        try:
+            yield key.decode(), value.decode()
+        except UnicodeDecodeError:
+            continue  # Torn write cut a multi-byte character short
+
+def _compact_worker(tree_ref, compact_needed):
+    """Background compaction loop; holds the tree only weakly so it can still be collected and closed"""
+    while True:
+        compact_needed.wait()
+        compact_needed.clear()
+        tree = tree_ref()
+        if tree is None or tree._closing:
+            return
+        if len(tree.sstables) > tree.compaction_threshold:
+            try:
+                tree.compact()
+            except Exception:
+                logger.exception("Background compaction failed; retrying after the next flush")
+        del tree
 
 class LSMTree:
-    def __init__(self, max_memtable_size=1000, sstable_dir="sstables"):
-        self.memtable = OrderedDict()
+    def __init__(self, max_memtable_size=1000, sstable_dir="sstables", sstable_cache_size=32,
+                 wal_sync_interval=100, compaction_threshold=8):
+        self._wal_fh = None
+        self._compactor = None
+        self.memtable = SortedDict()  # Kept in key order so flushes stream straight to disk
         self.sstables = []  # List of sstable file paths in order from newest to oldest
+        self.bloom_filters = []  # Bloom filter per sstable, parallel to self.sstables
         self.max_memtable_size = max_memtable_size
         self.wal_file = "wal.log"
+        self.wal_sync_interval = wal_sync_interval  # fsync the WAL once per this many inserts
         self.sstable_dir = sstable_dir
+        self.sstable_cache_size = sstable_cache_size
+        self._sstable_cache = OrderedDict()  # LRU of open SSTables, most recently used last
+        self._lock = threading.Lock()  # Guards sstables, bloom_filters and the SSTable cache
+        self._compact_lock = threading.Lock()  # Serializes compactions
+        self.compaction_threshold = compaction_threshold  # None disables background compaction
         self._initialize_storage()
         self._recover_from_wal()
         self._load_existing_sstables()
+        self._open_wal()
+        self._start_compactor()
 
     def _initialize_storage(self):
         """Create necessary directories if they don't exist"""
@@ -24,32 +80,139 @@ class LSMTree:
         """Recover data from Write-Ahead Log (WAL) after crash"""
         if os.path.exists(self.wal_file):
             try:
-                with open(self.wal_file, 'r') as f:
-                    for line in f:
-                        try:
-                            key, value = line.strip().split(':', 1)
-                            self.memtable[key] = value
-                        except ValueError:
-                            continue  # Skip malformed lines
+                with open(self.wal_file, 'rb') as f:
+                    data = f.read()
             except IOError:
-                pass  # Couldn't read WAL, start fresh
+                return  # Couldn't read WAL, start fresh
+            self.memtable = SortedDict(_decode_wal_records(data.splitlines()))
+            if data and not data.endswith(b'\n'):
+                # Terminate a torn last record so new appends start on a fresh line
+                with open(self.wal_file, 'ab') as f:
+                    f.write(b'\n')
+
+    def _open_wal(self):
+        """Open the long-lived, buffered WAL handle used by insert()"""
+        self._wal_fh = open(self.wal_file, 'ab', buffering=1 << 16)
+        self._wal_pending = 0
+
+    def _sync_wal(self):
+        """Group-commit buffered WAL records to disk"""
+        self._wal_fh.flush()
+        os.fsync(self._wal_fh.fileno())
+        self._wal_pending = 0
+
+    def _reset_wal(self):
+        """Discard the WAL once its contents are persisted elsewhere"""
+        self._wal_fh.close()
+        try:
+            os.remove(self.wal_file)
+        except OSError:
+            pass  # WAL might not exist
+        self._open_wal()
 
     def _load_existing_sstables(self):
         """Load existing SSTables from disk"""
-        sstable_files = sorted(glob.glob(os.path.join(self.sstable_dir, 'sstable_*.json')), reverse=True)
+        # Drop temp files left by writes interrupted before they were moved into place
+        for tmp_path in glob.glob(os.path.join(self.sstable_dir, 'sstable_*.tmp')):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        # Binary .sst tables, plus legacy .json tables written before the binary format,
+        # newest first by name timestamp (not by raw path, where 'compact_' sorts above digits)
+        sstable_files = sorted(glob.glob(os.path.join(self.sstable_dir, 'sstable_*.sst')) +
+                               glob.glob(os.path.join(self.sstable_dir, 'sstable_*.json')),
+                               key=_sstable_age, reverse=True)
         self.sstables = sstable_files
+        self.bloom_filters = [self._load_bloom_filter(sstable) for sstable in sstable_files]
+        # Resume SSTable naming after every timestamp already on disk
+        self._last_stamp = max((int(stamp) for sstable in sstable_files
+                                for stamp in re.findall(r'\d+', os.path.basename(sstable))), default=0)
+
+    def _sync_sstable_dir(self):
+        """fsync the SSTable directory so newly created files survive a power loss"""
+        try:
+            fd = os.open(self.sstable_dir, os.O_RDONLY)
+        except OSError:
+            return  # Directories can't be opened for fsync on this platform (e.g. Windows)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _next_stamp(self):
+        """Millisecond timestamp for a new SSTable name, strictly after every earlier one"""
+        with self._lock:
+            self._last_stamp = max(int(time.time() * 1000), self._last_stamp + 1)
+            return self._last_stamp
+
+    def _start_compactor(self):
+        """Start the background thread that compacts once too many SSTables pile up"""
+        if self.compaction_threshold is None:
+            return
+        self._closing = False
+        self._compact_needed = threading.Event()
+        self._compactor = threading.Thread(target=_compact_worker,
+                                           args=(weakref.ref(self), self._compact_needed), daemon=True)
+        self._compactor.start()
+        if len(self.sstables) > self.compaction_threshold:
+            self._compact_needed.set()
+
+    def _bloom_path(self, sstable):
+        """Path of the Bloom filter stored next to an SSTable"""
+        return os.path.splitext(sstable)[0] + '.bf'
+
+    def _load_bloom_filter(self, sstable):
+        """Load the Bloom filter for an SSTable (None if it has none)"""
+        try:
+            return BloomFilter.load(self._bloom_path(sstable))
+        except (IOError, ValueError, struct.error):
+            return None  # Legacy or damaged filter, always check the SSTable
+
+    def _write_bloom_filter(self, sstable, keys):
+        """Build and persist the Bloom filter for a freshly written SSTable"""
+        bloom = BloomFilter.for_keys(keys)
+        bloom.save(self._bloom_path(sstable))
+        return bloom
+
+    def _snapshot(self):
+        """Current (sstables, bloom_filters); both lists are replaced, never mutated, once published"""
+        with self._lock:
+            return self.sstables, self.bloom_filters
+
+    def _read_sstable(self, sstable):
+        """Return an open reader for an SSTable, served from the LRU cache when possible"""
+        with self._lock:
+            table = self._sstable_cache.get(sstable)
+            if table is not None:
+                self._sstable_cache.move_to_end(sstable)
+                return table
+        table = open_sstable(sstable)  # Opened outside the lock
+        with self._lock:
+            if sstable in self.sstables:  # Don't cache a table compacted away meanwhile
+                self._cache_sstable(sstable, table)
+        return table
+
+    def _cache_sstable(self, sstable, table):
+        """Insert an open SSTable into the cache, evicting the least recently used"""
+        self._sstable_cache[sstable] = table
+        self._sstable_cache.move_to_end(sstable)
+        while len(self._sstable_cache) > self.sstable_cache_size:
+            self._sstable_cache.popitem(last=False)
 
     def insert(self, key, value):
         """Insert a key-value pair into the LSM Tree"""
-        if not isinstance(key, str):
+        if type(key) is not str:
             key = str(key)
-        if not isinstance(value, str):
+        if type(value) is not str:
             value = str(value)
 
-        # Write to WAL first for durability
+        # Write to WAL first for durability; records are fsynced in groups
         try:
-            with open(self.wal_file, 'a') as f:
-                f.write(f"{key}:{value}\n")
+            self._wal_fh.write(f"{key}:{value}\n".encode())
+            self._wal_pending += 1
+            if self._wal_pending >= self.wal_sync_interval:
+                self._sync_wal()
         except IOError as e:
             raise IOError(f"Failed to write to WAL: {str(e)}")
 
@@ -65,117 +228,187 @@ class LSMTree:
         if not self.memtable:
             return
 
-        timestamp = int(time.time() * 1000)  # Millisecond precision
-        sstable_name = os.path.join(self.sstable_dir, f"sstable_{timestamp}.json")
+        timestamp = self._next_stamp()  # Millisecond precision, unique even for back-to-back flushes
+        sstable_name = os.path.join(self.sstable_dir, f"sstable_{timestamp}.sst")
         
         try:
             # Write new SSTable
-            with open(sstable_name, 'w') as f:
-                json.dump(self.memtable, f)
+            write_sstable(sstable_name, self.memtable.items())
+            bloom = self._write_bloom_filter(sstable_name, self.memtable.keys())
             
             # Update sstables list (newest first)
-            self.sstables.insert(0, sstable_name)
+            reader = SSTableReader(sstable_name)
+            with self._lock:
+                self.sstables = [sstable_name] + self.sstables
+                self.bloom_filters = [bloom] + self.bloom_filters
+                self._cache_sstable(sstable_name, reader)
+            if self._compactor is not None and len(self.sstables) > self.compaction_threshold:
+                self._compact_needed.set()
             
-            # Clear memtable and WAL
-            self.memtable = OrderedDict()
-            try:
-                os.remove(self.wal_file)
-            except OSError:
-                pass  # WAL might not exist
+            # Clear memtable and WAL; the SSTable file is already fsynced, make its
+            # directory entry durable too before the WAL copy of the data goes away
+            self._sync_sstable_dir()
+            self.memtable = SortedDict()
+            self._reset_wal()
             
         except IOError as e:
             raise IOError(f"Failed to flush memtable to SSTable: {str(e)}")
 
     def get(self, key):
         """Retrieve a value by key (returns None if not found)"""
-        if not isinstance(key, str):
+        if type(key) is not str:
             key = str(key)
 
-        # Check memtable first (most recent data)
-        if key in self.memtable:
-            return self.memtable[key]
-        
-        # Check SSTables from newest to oldest
-        for sstable in self.sstables:
-            try:
-                with open(sstable, 'r') as f:
-                    data = json.load(f)
-                    if key in data:
-                        return data[key]
-            except (IOError, json.JSONDecodeError):
-                continue  # Skip corrupt SSTables
+        # Check memtable first (most recent data); bind it once in case a flush swaps it
+        memtable = self.memtable
+        if key in memtable:
+            return memtable[key]
         
-        return None
+        # Check SSTables from newest to oldest, skipping those whose filter rules the key out.
+        # The walk runs on a snapshot outside the lock; if a compaction removes a table
+        # before we open it, retry on the new list.
+        hashes = key_hashes(key)  # Hashed once, probed against every filter
+        while True:
+            sstables, bloom_filters = self._snapshot()
+            stale = False
+            for sstable, bloom in zip(sstables, bloom_filters):
+                if bloom is not None and not bloom.might_contain(hashes):
+                    continue
+                try:
+                    value = self._read_sstable(sstable).get(key)
+                except (IOError, ValueError):
+                    if self.sstables is not sstables:
+                        stale = True
+                        break
+                    continue  # Skip corrupt SSTables
+                if value is not None:
+                    return value
+            if not stale:
+                return None
 
     def range_query(self, start_key, end_key):
         """Get all values where start_key <= key <= end_key"""
         results = []
         
         # Convert keys to strings if they aren't already
-        if not isinstance(start_key, str):
+        if type(start_key) is not str:
             start_key = str(start_key)
-        if not isinstance(end_key, str):
+        if type(end_key) is not str:
             end_key = str(end_key)
 
         # Check memtable first
-        for key, value in self.memtable.items():
-            if start_key <= key <= end_key:
-                results.append((key, value))  # Return (key, value) pairs
+        memtable = self.memtable
+        for key in memtable.irange(start_key, end_key):
+            results.append((key, memtable[key]))  # Return (key, value) pairs
         
-        # Check SSTables from newest to oldest
-        for sstable in self.sstables:
-            try:
-                with open(sstable, 'r') as f:
-                    data = json.load(f)
-                    for key, value in data.items():
-                        if start_key <= key <= end_key:
-                            results.append((key, value))
-            except (IOError, json.JSONDecodeError):
-                continue  # Skip corrupt SSTables
+        # Check SSTables from newest to oldest, on a snapshot read outside the lock
+        while True:
+            sstables, _ = self._snapshot()
+            sstable_results = []
+            stale = False
+            for sstable in sstables:
+                try:
+                    sstable_results.extend(self._read_sstable(sstable).range(start_key, end_key))
+                except (IOError, ValueError):
+                    if self.sstables is not sstables:
+                        stale = True  # Compacted away before we opened it; retry on the new list
+                        break
+                    continue  # Skip corrupt SSTables
+            if not stale:
+                break
         
-        return results
+        return results + sstable_results
+
+    def _compacted_name(self, newest):
+        """Name a compacted SSTable so it sorts just after its newest input on reload"""
+        timestamp = self._next_stamp()
+        match = _SSTABLE_NAME.match(os.path.basename(newest))
+        stamp = match.group(1) if match else timestamp
+        return os.path.join(self.sstable_dir, f"sstable_{stamp}_c{timestamp}.sst")
 
     def compact(self):
-        """Perform compaction to merge and reduce SSTables"""
-        if len(self.sstables) <= 1:
-            return  # Nothing to compact
+        """Perform compaction to merge and reduce SSTables; reads and flushes continue meanwhile"""
+        with self._compact_lock:
+            with self._lock:
+                victims = list(self.sstables)
+            if len(victims) <= 1:
+                return  # Nothing to compact
 
-        # Create a new merged SSTable
-        merged = OrderedDict()
-        for sstable in reversed(self.sstables):  # Process from oldest to newest
-            try:
-                with open(sstable, 'r') as f:
-                    data = json.load(f)
-                    merged.update(data)
-            except (IOError, json.JSONDecodeError):
-                continue  # Skip corrupt SSTables
-
-        # Write new compacted SSTable
-        timestamp = int(time.time() * 1000)
-        new_sstable = os.path.join(self.sstable_dir, f"sstable_compact_{timestamp}.json")
-        with open(new_sstable, 'w') as f:
-            json.dump(merged, f)
-
-        # Remove old SSTables
-        for sstable in self.sstables:
+            # Open every SSTable (newest first) as a sorted run, using private readers
+            # so the merge runs without holding the lock
+            tables = []
+            for sstable in victims:
+                try:
+                    tables.append(open_sstable(sstable))
+                except (IOError, ValueError):
+                    continue  # Skip corrupt SSTables
+
+            # Stream the k-way merge straight into the new compacted SSTable, filling a
+            # Bloom filter sized from the inputs' record bounds as keys go past
+            bloom = BloomFilter.for_capacity(sum(table.max_records for table in tables))
+            def add_to_bloom(items):
+                for key, value in items:
+                    bloom.add(key)
+                    yield key, value
+
+            new_sstable = self._compacted_name(victims[0])
             try:
-                os.remove(sstable)
-            except OSError:
-                pass
+                write_sstable(new_sstable, add_to_bloom(merge_sstables(tables)))
+            finally:
+                for table in tables:
+                    table.close()
+            bloom.save(self._bloom_path(new_sstable))
+            reader = SSTableReader(new_sstable)
+
+            # Swap the compacted table in for its inputs; SSTables flushed meanwhile stay in front
+            victim_set = set(victims)
+            with self._lock:
+                kept = [(sstable, bf) for sstable, bf in zip(self.sstables, self.bloom_filters)
+                        if sstable not in victim_set]
+                self.sstables = [sstable for sstable, _ in kept] + [new_sstable]
+                self.bloom_filters = [bf for _, bf in kept] + [bloom]
+                # Readers still in use by in-flight lookups stay valid; refcounting frees them
+                for sstable in victims:
+                    self._sstable_cache.pop(sstable, None)
+                self._cache_sstable(new_sstable, reader)
 
-        # Update sstables list with just the new compacted one
-        self.sstables = [new_sstable]
+            # Remove old SSTables and their filters once the compacted one is durable
+            self._sync_sstable_dir()
+            for sstable in victims:
+                for path in (sstable, self._bloom_path(sstable)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
 
     def clear(self):
         """Clear all data (for testing/reset purposes)"""
-        self.memtable = OrderedDict()
-        self.sstables = []
-        try:
-            os.remove(self.wal_file)
-        except OSError:
-            pass
-        for sstable in glob.glob(os.path.join(self.sstable_dir, 'sstable_*.json')):
-            try:
-                os.remove(sstable)
-            except OSError:
-                pass
\ No newline at end of file
+        with self._compact_lock, self._lock:
+            self.memtable = SortedDict()
+            self.sstables = []
+            self.bloom_filters = []
+            self._sstable_cache.clear()  # In-flight lookups keep their readers until done
+            self._reset_wal()
+            for sstable in glob.glob(os.path.join(self.sstable_dir, 'sstable_*.*')):
+                try:
+                    os.remove(sstable)
+                except OSError:
+                    pass
+
+    def close(self):
+        """Stop background compaction, flush pending WAL records and release file handles"""
+        if self._compactor is not None:
+            self._closing = True
+            self._compact_needed.set()
+            if self._compactor is not threading.current_thread():
+                self._compactor.join()
+            self._compactor = None
+        if self._wal_fh is not None and not self._wal_fh.closed:
+            self._sync_wal()
+            self._wal_fh.close()
+        for table in self._sstable_cache.values():
+            table.close()
+        self._sstable_cache.clear()
+
+    def __del__(self):
+        self.close()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import orjson
+
+# On-disk layout of a binary SSTable:
+#   data   : (varint key_len, key, varint value_len, value) records sorted by key
+#   index  : (varint key_len, key, varint offset) fence pointer every BLOCK_SIZE records
+#   trailer: uint64 index offset + MAGIC
+BLOCK_SIZE = 64
+MAGIC = b'SST1'
+_TRAILER = struct.Struct('<Q4s')
+
+def _encode_varint(n):
+    """Encode a non-negative int as LEB128"""
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def _decode_varint(buf, pos):
+    """Decode a LEB128 int at pos, returning (value, next_pos)"""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _encode_str(s):
+    data = s.encode('utf-8')
+    return _encode_varint(len(data)) + data
+
+def _decode_str(buf, pos):
+    length, pos = _decode_varint(buf, pos)
+    return buf[pos:pos + length].decode('utf-8'), pos + length
+
+def write_sstable(path, items):
+    """Write (key, value) string pairs, already sorted by key, as a binary SSTable and fsync it"""
+    fences = []
+    offset = 0
+    # Build in <path>.tmp and move it into place only once complete
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for i, (key, value) in enumerate(items):
+                if i % BLOCK_SIZE == 0:
+                    fences.append((key, offset))
+                record = _encode_str(key) + _encode_str(value)
+                f.write(record)
+                offset += len(record)
+            for key, fence_offset in fences:
+                f.write(_encode_str(key) + _encode_varint(fence_offset))
+            f.write(_TRAILER.pack(offset, MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class SSTableReader:
+    """Memory-mapped binary SSTable; only the fence pointers are held in memory"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._data_end, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a valid SSTable")
+
+        self.fence_keys = []
+        self.fence_offsets = []
+        pos = self._data_end
+        index_end = len(self._mm) - _TRAILER.size
+        while pos < index_end:
+            key, pos = _decode_str(self._mm, pos)
+            fence_offset, pos = _decode_varint(self._mm, pos)
+            self.fence_keys.append(key)
+            self.fence_offsets.append(fence_offset)
+
+    def _scan(self, pos, end):
+        """Yield (key, value) records between two data offsets"""
+        while pos < end:
+            key, pos = _decode_str(self._mm, pos)
+            value, pos = _decode_str(self._mm, pos)
+            yield key, value
+
+    def get(self, key):
+        """Return the value for key (None if absent), scanning a single block"""
+        block = bisect.bisect_right(self.fence_keys, key) - 1
+        if block < 0:
+            return None
+        if block + 1 < len(self.fence_offsets):
+            end = self.fence_offsets[block + 1]
+        else:
+            end = self._data_end
+        for k, v in self._scan(self.fence_offsets[block], end):
+            if k == key:
+                return v
+            if k > key:
+                break
+        return None
+
+    def range(self, start_key, end_key):
+        """Yield (key, value) pairs where start_key <= key <= end_key, in key order"""
+        if not self.fence_offsets:
+            return
+        block = max(bisect.bisect_right(self.fence_keys, start_key) - 1, 0)
+        for k, v in self._scan(self.fence_offsets[block], self._data_end):
+            if k > end_key:
+                break
+            if k >= start_key:
+                yield k, v
+
+    def items(self):
+        """Yield every (key, value) pair in key order"""
+        return self._scan(0, self._data_end)
+
+    @property
+    def max_records(self):
+        """Upper bound on the record count: every block holds at most BLOCK_SIZE records"""
+        return len(self.fence_offsets) * BLOCK_SIZE
+
+    def close(self):
+        self._mm.close()
+
+class JSONSSTable:
+    """Read-only view of a legacy JSON SSTable with the SSTableReader interface"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = orjson.loads(f.read())
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def range(self, start_key, end_key):
+        for key, value in self._data.items():
+            if start_key <= key <= end_key:
+                yield key, value
+
+    def items(self):
+        return iter(sorted(self._data.items()))
+
+    @property
+    def max_records(self):
+        return len(self._data)
+
+    def close(self):
+        pass
+
+def open_sstable(path):
+    """Open an SSTable, falling back to the legacy JSON format for .json files"""
+    if path.endswith('.json'):
+        return JSONSSTable(path)
+    return SSTableReader(path)
+
+def _tag_run(items, age):
+    """Tag each (key, value) pair with its run's age so heapq.merge breaks key ties newest first"""
+    for key, value in items:
+        yield key, age, value
+
+def merge_sstables(tables):
+    """K-way merge of SSTables given newest first, yielding the newest (key, value) per key in key order"""
+    runs = [_tag_run(table.items(), age) for age, table in enumerate(tables)]
+    previous = None
+    for key, _, value in heapq.merge(*runs):
+        if key != previous:
+            previous = key
+            yield key, value